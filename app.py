@@ -2,11 +2,13 @@ from flask import Flask, render_template, request, jsonify, send_file
 import os
 import pandas as pd
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import re
 from dotenv import load_dotenv
 import threading
 from io import BytesIO
+from utils.export_history import ExportHistory, hash_rows_by_issue, build_delta
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -14,7 +16,16 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Folga aplicada ao filtro "updated" das exportações incrementais, cobrindo a
+# diferença de fuso entre o servidor e o usuário do Jira. Issues repetidas são
+# descartadas pela comparação de hashes.
+DELTA_MARGIN = timedelta(hours=int(os.getenv('DELTA_MARGIN_HOURS', 24)))
+
 class JiraService:
+    AVARIAS_JQL = 'project = LOG AND "Request Type" = "Informar avaria na entrega - Central de Produção" AND "Centro de Distribuição - Central de Produção" = RJ ORDER BY created DESC, priority DESC'
+    QUALIDADE_JQL = 'project = LOG AND "Request Type" = "Qualidade (LOG)" AND "Centro de Distribuição - Central de Produção" = RJ ORDER BY priority ASC, "Tempo de resolução" ASC'
+    DEVOLUCOES_JQL = 'project = LOG AND "Request Type" = "Devolução aos CDs por avarias de validade" AND "Centro de distribuição de destino (CD)" = "CD Pavuna RJ (CD03)" ORDER BY priority DESC, "Tempo de resolução" ASC'
+
     def __init__(self):
         # Buscar credenciais das variáveis de ambiente
         self.email = os.getenv('JIRA_EMAIL')
@@ -30,40 +41,65 @@ class JiraService:
             "Content-Type": "application/json"
         }
         self.max_results = 100
+        # Indica se a última busca trouxe cada issue do total exatamente uma vez
+        self.last_fetch_complete = False
         
-    def fetch_issues(self, jql, process_function):
-        """Busca issues do Jira usando JQL"""
+    def fetch_issues(self, jql, process_function, fields=None, strict=False):
+        """Busca issues do Jira usando JQL.
+
+        Com `strict`, falha se qualquer página falhar ou se o total não
+        conferir, em vez de pular a página. Usado nas exportações incrementais,
+        onde uma issue perdida seria reportada de forma errada; a JQL deve ter
+        ordenação estável (ORDER BY key).
+        """
         url = f"https://hnt.atlassian.net/rest/api/2/search"
         data_to_save = []
+        fetched_keys = []
+        skipped_pages = False
+        total_issues = None
+        self.last_fetch_complete = False
+        params = {
+            'jql': jql,
+            'maxResults': self.max_results,
+            'startAt': 0
+        }
+        if fields:
+            params['fields'] = fields
         
         try:
-            # Primeira requisição para obter o total
-            params = {
-                'jql': jql,
-                'maxResults': self.max_results,
-                'startAt': 0
-            }
-            
-            response = self.session.get(url, params=params, verify=False)
-            
-            if response.status_code == 200:
-                data = response.json()
-                total_issues = data['total']
-                pages = -(-total_issues // self.max_results)  # Ceiling division
+            # A primeira página também informa o total
+            while total_issues is None or params['startAt'] < total_issues:
+                response = self.session.get(url, params=params, verify=False)
                 
-                # Processar todas as páginas
-                for page in range(pages):
-                    params['startAt'] = page * self.max_results
-                    response = self.session.get(url, params=params, verify=False)
-                    
-                    if response.status_code == 200:
-                        issues = response.json()["issues"]
-                        for issue in issues:
-                            process_function(issue, data_to_save)
+                if response.status_code != 200:
+                    if strict or total_issues is None:
+                        return None, f"Erro na requisição: {response.status_code} - Verifique as credenciais no .env"
+                    skipped_pages = True
+                    params['startAt'] += self.max_results
+                    continue
                 
-                return data_to_save, total_issues
-            else:
-                return None, f"Erro na requisição: {response.status_code} - Verifique as credenciais no .env"
+                data = response.json()
+                if total_issues is None:
+                    total_issues = data['total']
+                elif strict and data['total'] != total_issues:
+                    return None, "Os dados mudaram durante a busca, tente novamente"
+                
+                issues = data["issues"]
+                if not issues:
+                    break
+                for issue in issues:
+                    process_function(issue, data_to_save)
+                fetched_keys.extend(issue["key"] for issue in issues)
+                params['startAt'] += len(issues)
+            
+            # Ordenações instáveis podem repetir ou pular issues entre as páginas
+            self.last_fetch_complete = (
+                not skipped_pages and len(set(fetched_keys)) == len(fetched_keys) == total_issues
+            )
+            if strict and not self.last_fetch_complete:
+                return None, f"Busca incompleta: {len(set(fetched_keys))} de {total_issues} issues, tente novamente"
+            
+            return data_to_save, total_issues
                 
         except Exception as e:
             return None, f"Erro: {str(e)}"
@@ -82,7 +118,7 @@ class JiraService:
     
     def fetch_avarias(self):
         """Busca avarias"""
-        jql = 'project = LOG AND "Request Type" = "Informar avaria na entrega - Central de Produção" AND "Centro de Distribuição - Central de Produção" = RJ ORDER BY created DESC, priority DESC'
+        jql = self.AVARIAS_JQL
         data, result = self.fetch_issues(jql, self.process_avaria_issue)
         
         if data:
@@ -92,7 +128,7 @@ class JiraService:
     
     def fetch_qualidade(self):
         """Busca qualidade"""
-        jql = 'project = LOG AND "Request Type" = "Qualidade (LOG)" AND "Centro de Distribuição - Central de Produção" = RJ ORDER BY priority ASC, "Tempo de resolução" ASC'
+        jql = self.QUALIDADE_JQL
         data, result = self.fetch_issues(jql, self.process_qualidade_issue)
         
         if data:
@@ -102,7 +138,7 @@ class JiraService:
     
     def fetch_devolucoes(self):
         """Busca devoluções"""
-        jql = 'project = LOG AND "Request Type" = "Devolução aos CDs por avarias de validade" AND "Centro de distribuição de destino (CD)" = "CD Pavuna RJ (CD03)" ORDER BY priority DESC, "Tempo de resolução" ASC'
+        jql = self.DEVOLUCOES_JQL
         data, result = self.fetch_issues(jql, self.process_devolucao_issue)
         
         if data:
@@ -110,6 +146,54 @@ class JiraService:
         
         return None, result
     
+    def get_delta_source(self, report_type):
+        """JQL e função de processamento dos relatórios com exportação incremental"""
+        sources = {
+            'avarias': (self.AVARIAS_JQL, self.process_avaria_issue),
+            'qualidade': (self.QUALIDADE_JQL, self.process_qualidade_issue),
+            'devolucoes': (self.DEVOLUCOES_JQL, self.process_devolucao_issue),
+        }
+        return sources.get(report_type)
+    
+    def build_delta_jql(self, report_type, since):
+        """Monta as JQLs das issues atualizadas que atendem e que deixaram de atender ao filtro"""
+        jql, _ = self.get_delta_source(report_type)
+        jql_filter = jql.partition(' ORDER BY ')[0]
+        updated = f'updated >= "{since.strftime("%Y-%m-%d %H:%M")}"'
+        
+        # NOT (campo = valor) não encontra issues com o campo vazio no Jira
+        fields = [field for field in re.findall(r'("[^"]+"|\w+) = ', jql_filter) if field != 'project']
+        not_matching = ' OR '.join([f'NOT ({jql_filter})'] + [f'{field} is EMPTY' for field in fields])
+        
+        changed_jql = f'{jql_filter} AND {updated} ORDER BY key ASC'
+        removed_jql = f'project = LOG AND {updated} AND ({not_matching}) ORDER BY key ASC'
+        return changed_jql, removed_jql
+    
+    def fetch_delta(self, report_type, since):
+        """Busca somente as issues atualizadas desde a data informada.
+
+        Retorna as linhas das issues que atendem ao filtro do relatório e as
+        chaves das que foram atualizadas e deixaram de atender. Issues
+        excluídas do Jira não aparecem em nenhuma das buscas.
+        """
+        _, process_function = self.get_delta_source(report_type)
+        changed_jql, removed_jql = self.build_delta_jql(report_type, since)
+        
+        rows, result = self.fetch_issues(changed_jql, process_function, strict=True)
+        if rows is None:
+            return None, result
+        
+        removed_keys, result = self.fetch_issues(
+            removed_jql,
+            lambda issue, keys: keys.append(issue["key"]),
+            fields='key',
+            strict=True
+        )
+        if removed_keys is None:
+            return None, result
+        
+        return rows, removed_keys
+    
     def process_divergencia_issue(self, issue, data_to_save):
         """Processa issue de divergência"""
         created_raw = issue["fields"].get("created", "")
@@ -345,6 +429,10 @@ def fetch_data():
         except ValueError as e:
             return jsonify({'success': False, 'message': str(e)})
         
+        since = (data.get('since') or '').strip()
+        if since:
+            return fetch_delta_data(jira_service, report_type, since)
+        
         if report_type == 'divergencias':
             start_date = data.get('start_date')
             end_date = data.get('end_date')
@@ -369,16 +457,59 @@ def fetch_data():
         if result is None:
             return jsonify({'success': False, 'message': count})
         
+        # Registrar os hashes por issue como base para futuras exportações incrementais,
+        # somente se a busca trouxe cada issue exatamente uma vez
+        export_id = None
+        if jira_service.get_delta_source(report_type) and jira_service.last_fetch_complete:
+            export_id = save_export_snapshot(report_type, hash_rows_by_issue(result))
+        
         return jsonify({
             'success': True, 
             'data': result, 
             'count': count,
+            'export_id': export_id,
             'message': f'{count} registros encontrados'
         })
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro: {str(e)}'})
 
+def save_export_snapshot(report_type, hashes):
+    """Registra o snapshot da exportação; falhas de escrita não impedem o download"""
+    try:
+        return ExportHistory().save(report_type, hashes)['id']
+    except OSError as e:
+        app.logger.warning(f'Não foi possível salvar o snapshot de {report_type}: {e}')
+        return None
+
+def fetch_delta_data(jira_service, report_type, since):
+    """Retorna apenas as linhas das issues criadas, alteradas ou removidas desde uma exportação anterior"""
+    if not jira_service.get_delta_source(report_type):
+        return jsonify({'success': False, 'message': 'Exportação incremental não disponível para este relatório'})
+    
+    history = ExportHistory()
+    baseline, error = history.resolve(report_type, since)
+    if baseline is None:
+        return jsonify({'success': False, 'message': error})
+    
+    baseline_time = datetime.fromisoformat(baseline['created_at'])
+    changed_rows, removed_keys = jira_service.fetch_delta(report_type, baseline_time - DELTA_MARGIN)
+    if changed_rows is None:
+        return jsonify({'success': False, 'message': removed_keys})
+    
+    delta_rows, hashes = build_delta(baseline['hashes'], changed_rows, removed_keys)
+    export_id = save_export_snapshot(report_type, hashes)
+    count = len(delta_rows)
+    
+    return jsonify({
+        'success': True,
+        'data': delta_rows,
+        'count': count,
+        'export_id': export_id,
+        'baseline_id': baseline['id'],
+        'message': f'{count} registros alterados desde {baseline["id"]}'
+    })
+
 @app.route('/download_excel', methods=['POST'])
 def download_excel():
     try:
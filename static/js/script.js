@@ -1,6 +1,8 @@
 // Global variables
 let currentData = [];
 let currentType = '';
+let currentExportId = null;
+let currentIsDelta = false;
 
 // Theme management
 function toggleTheme() {
@@ -71,6 +73,12 @@ async function fetchData(type) {
         requestData.end_date = endDate;
     }
     
+    // Exportação incremental: somente alterações desde uma exportação anterior
+    const sinceInput = document.getElementById(`since_${type}`);
+    if (sinceInput && sinceInput.value.trim()) {
+        requestData.since = sinceInput.value.trim();
+    }
+    
     showLoading();
     
     try {
@@ -87,6 +95,19 @@ async function fetchData(type) {
         if (result.success) {
             currentData = result.data;
             currentType = type;
+            currentExportId = result.export_id || null;
+            currentIsDelta = Boolean(requestData.since);
+            
+            // Guardar o ID para sugerir na próxima exportação incremental
+            if (currentExportId && sinceInput) {
+                localStorage.setItem(`lastExport_${type}`, currentExportId);
+                showLastExportHint(type, currentExportId);
+            }
+            
+            if (currentIsDelta && result.count === 0) {
+                showToast('Nenhuma alteração desde a exportação informada.', 'warning');
+                return;
+            }
             
             showToast(`${result.count} registros encontrados. Iniciando download...`, 'success');
             
@@ -169,6 +190,11 @@ function generateFilename() {
     
     let filename = `${currentType}_${timestamp}.xlsx`;
     
+    // O ID da exportação no nome permite usá-lo como base da próxima exportação incremental
+    if (currentExportId) {
+        filename = currentIsDelta ? `${currentExportId}_delta.xlsx` : `${currentExportId}.xlsx`;
+    }
+    
     if (currentType === 'divergencias') {
         const startDate = document.getElementById('start_date').value;
         const endDate = document.getElementById('end_date').value;
@@ -194,6 +220,34 @@ function setDefaultDates() {
     }
 }
 
+// Show last export ID as a button that fills the incremental export input
+function showLastExportHint(type, exportId) {
+    const hint = document.getElementById(`last_export_${type}`);
+    if (!hint) {
+        return;
+    }
+    
+    hint.textContent = `Usar última exportação: ${exportId}`;
+    hint.dataset.exportId = exportId;
+    hint.hidden = false;
+}
+
+function initLastExportHints() {
+    document.querySelectorAll('.last-export-hint').forEach(hint => {
+        const type = hint.dataset.type;
+        const lastExport = localStorage.getItem(`lastExport_${type}`);
+        if (lastExport) {
+            showLastExportHint(type, lastExport);
+        }
+        
+        hint.addEventListener('click', () => {
+            const input = document.getElementById(`since_${type}`);
+            input.value = hint.dataset.exportId;
+            input.focus();
+        });
+    });
+}
+
 // Add loading states to buttons
 function setButtonLoading(button, loading = true) {
     if (loading) {
@@ -284,6 +338,7 @@ function addPulseAnimation() {
 document.addEventListener('DOMContentLoaded', function() {
     initTheme();
     setDefaultDates();
+    initLastExportHints();
     initializeButtons();
     initKeyboardShortcuts();
     addPulseAnimation();
@@ -0,0 +1,283 @@
+from datetime import datetime
+
+import pytest
+
+import app as jira_app
+
+
+@pytest.fixture
+def jira_service(monkeypatch):
+    monkeypatch.setenv('JIRA_EMAIL', 'teste@empresa.com')
+    monkeypatch.setenv('JIRA_TOKEN', 'token')
+    return jira_app.JiraService()
+
+
+def test_build_delta_jql_for_devolucoes(jira_service):
+    changed_jql, removed_jql = jira_service.build_delta_jql('devolucoes', datetime(2026, 10, 18, 8, 5))
+
+    jql_filter = (
+        'project = LOG AND "Request Type" = "Devolução aos CDs por avarias de validade" '
+        'AND "Centro de distribuição de destino (CD)" = "CD Pavuna RJ (CD03)"'
+    )
+    assert changed_jql == f'{jql_filter} AND updated >= "2026-10-18 08:05" ORDER BY key ASC'
+    assert removed_jql == (
+        f'project = LOG AND updated >= "2026-10-18 08:05" AND (NOT ({jql_filter}) '
+        'OR "Request Type" is EMPTY OR "Centro de distribuição de destino (CD)" is EMPTY) '
+        'ORDER BY key ASC'
+    )
+
+
+def test_build_delta_jql_checks_empty_fields_of_every_report(jira_service):
+    for report_type, field in [
+        ('avarias', '"Centro de Distribuição - Central de Produção"'),
+        ('qualidade', '"Centro de Distribuição - Central de Produção"'),
+    ]:
+        _, removed_jql = jira_service.build_delta_jql(report_type, datetime(2026, 10, 18))
+
+        assert f'OR {field} is EMPTY' in removed_jql
+        assert 'project is EMPTY' not in removed_jql
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+
+def make_issue(key, loja='Loja 1'):
+    return {
+        'key': key,
+        'fields': {
+            'created': '2026-10-18T10:00:00.000-0300',
+            'customfield_10169': loja,
+        },
+    }
+
+
+def serve_pages(issues, total=None, failing_pages=(), totals=None):
+    """Simula a paginação da busca do Jira a partir de uma lista de issues"""
+    calls = []
+
+    def get(url, params=None, verify=None):
+        calls.append(dict(params))
+        page = len(calls) - 1
+        if page in failing_pages:
+            return FakeResponse({}, status_code=500)
+        start = params['startAt']
+        return FakeResponse({
+            'total': (totals[page] if totals else total if total is not None else len(issues)),
+            'issues': issues[start:start + params['maxResults']],
+        })
+
+    get.calls = calls
+    return get
+
+
+def collect_keys(issue, keys):
+    keys.append(issue['key'])
+
+
+def test_fetch_issues_pages_without_repeating_the_first_page(jira_service):
+    jira_service.max_results = 2
+    jira_service.session.get = serve_pages([make_issue(f'LOG-{i}') for i in range(5)])
+
+    keys, total = jira_service.fetch_issues('project = LOG', collect_keys)
+
+    assert keys == ['LOG-0', 'LOG-1', 'LOG-2', 'LOG-3', 'LOG-4']
+    assert total == 5
+    assert [call['startAt'] for call in jira_service.session.get.calls] == [0, 2, 4]
+    assert jira_service.last_fetch_complete
+
+
+def test_fetch_issues_skips_failing_page_unless_strict(jira_service):
+    jira_service.max_results = 2
+    issues = [make_issue(f'LOG-{i}') for i in range(5)]
+
+    jira_service.session.get = serve_pages(issues, failing_pages=[1])
+    keys, total = jira_service.fetch_issues('project = LOG', collect_keys)
+    assert keys == ['LOG-0', 'LOG-1', 'LOG-4']
+    assert not jira_service.last_fetch_complete
+
+    jira_service.session.get = serve_pages(issues, failing_pages=[1])
+    keys, error = jira_service.fetch_issues('project = LOG', collect_keys, strict=True)
+    assert keys is None
+    assert '500' in error
+
+
+def test_fetch_issues_strict_fails_when_total_changes(jira_service):
+    jira_service.max_results = 2
+    jira_service.session.get = serve_pages(
+        [make_issue(f'LOG-{i}') for i in range(4)], totals=[4, 5]
+    )
+
+    keys, error = jira_service.fetch_issues('project = LOG', collect_keys, strict=True)
+
+    assert keys is None
+    assert 'mudaram' in error
+
+
+def test_fetch_issues_strict_fails_on_short_fetch(jira_service):
+    jira_service.max_results = 2
+    jira_service.session.get = serve_pages([make_issue(f'LOG-{i}') for i in range(3)], total=5)
+
+    keys, error = jira_service.fetch_issues('project = LOG', collect_keys, strict=True)
+
+    assert keys is None
+    assert 'Busca incompleta: 3 de 5' in error
+
+
+def test_fetch_issues_flags_repeated_issues(jira_service):
+    jira_service.max_results = 2
+    issues = [make_issue('LOG-0'), make_issue('LOG-1'), make_issue('LOG-1')]
+    jira_service.session.get = serve_pages(issues)
+
+    keys, total = jira_service.fetch_issues('project = LOG', collect_keys)
+    assert keys == ['LOG-0', 'LOG-1', 'LOG-1']
+    assert not jira_service.last_fetch_complete
+
+    jira_service.session.get = serve_pages(issues)
+    keys, error = jira_service.fetch_issues('project = LOG', collect_keys, strict=True)
+    assert keys is None
+
+
+class FakeJira:
+    """Responde às buscas completas e incrementais com conjuntos de issues distintos"""
+
+    def __init__(self):
+        self.all_issues = []
+        self.changed_issues = []
+        self.removed_issues = []
+        self.failing = False
+        self.queries = []
+
+    def get(self, url, params=None, verify=None):
+        jql = params['jql']
+        self.queries.append(jql)
+        if self.failing:
+            return FakeResponse({}, status_code=500)
+        if 'updated >=' in jql and 'NOT (' in jql:
+            issues = self.removed_issues
+        elif 'updated >=' in jql:
+            issues = self.changed_issues
+        else:
+            issues = self.all_issues
+        start = params['startAt']
+        return FakeResponse({
+            'total': len(issues),
+            'issues': issues[start:start + params['maxResults']],
+        })
+
+
+@pytest.fixture
+def fake_jira(monkeypatch, tmp_path):
+    monkeypatch.setenv('JIRA_EMAIL', 'teste@empresa.com')
+    monkeypatch.setenv('JIRA_TOKEN', 'token')
+    monkeypatch.setenv('EXPORT_HISTORY_DIR', str(tmp_path))
+    fake = FakeJira()
+    monkeypatch.setattr(jira_app.requests.Session, 'get', lambda session, *args, **kwargs: fake.get(*args, **kwargs))
+    return fake
+
+
+@pytest.fixture
+def client():
+    return jira_app.app.test_client()
+
+
+def test_fetch_data_full_export_returns_export_id(fake_jira, client):
+    fake_jira.all_issues = [make_issue('LOG-1'), make_issue('LOG-2')]
+
+    result = client.post('/fetch_data', json={'type': 'avarias'}).get_json()
+
+    assert result['success']
+    assert result['count'] == 2
+    assert result['export_id'].startswith('avarias-')
+
+
+def test_fetch_data_since_returns_only_changes(fake_jira, client):
+    fake_jira.all_issues = [make_issue('LOG-1'), make_issue('LOG-2'), make_issue('LOG-3')]
+    baseline = client.post('/fetch_data', json={'type': 'avarias'}).get_json()
+
+    fake_jira.changed_issues = [make_issue('LOG-1'), make_issue('LOG-2', loja='Loja 2'), make_issue('LOG-4')]
+    fake_jira.removed_issues = [{'key': 'LOG-3', 'fields': {}}]
+    result = client.post('/fetch_data', json={
+        'type': 'avarias', 'since': baseline['export_id']
+    }).get_json()
+
+    assert result['success']
+    assert result['baseline_id'] == baseline['export_id']
+    assert result['export_id'] != baseline['export_id']
+    assert [(row['Tipo de Alteração'], row['LOG']) for row in result['data']] == [
+        ('Atualizado', 'LOG-2'), ('Criado', 'LOG-4'), ('Removido', 'LOG-3')
+    ]
+    assert all('ORDER BY key ASC' in jql for jql in fake_jira.queries[-2:])
+
+
+def test_fetch_data_since_reports_jira_errors(fake_jira, client):
+    fake_jira.all_issues = [make_issue('LOG-1')]
+    baseline = client.post('/fetch_data', json={'type': 'avarias'}).get_json()
+
+    fake_jira.failing = True
+    result = client.post('/fetch_data', json={
+        'type': 'avarias', 'since': baseline['export_id']
+    }).get_json()
+
+    assert not result['success']
+    assert '500' in result['message']
+
+
+def test_fetch_data_since_unknown_export(fake_jira, client):
+    result = client.post('/fetch_data', json={'type': 'avarias', 'since': 'avarias-inexistente'}).get_json()
+
+    assert not result['success']
+    assert 'Exportação não encontrada' in result['message']
+
+
+def test_fetch_data_since_not_available_for_divergencias(fake_jira, client):
+    result = client.post('/fetch_data', json={'type': 'divergencias', 'since': '18/10/2026'}).get_json()
+
+    assert not result['success']
+    assert 'não disponível' in result['message']
+
+
+def test_fetch_data_without_snapshot_when_save_fails(fake_jira, client, monkeypatch):
+    fake_jira.all_issues = [make_issue('LOG-1')]
+
+    def fail_save(self, report_type, hashes):
+        raise OSError('disco somente leitura')
+
+    monkeypatch.setattr(jira_app.ExportHistory, 'save', fail_save)
+    result = client.post('/fetch_data', json={'type': 'avarias'}).get_json()
+
+    assert result['success']
+    assert result['count'] == 1
+    assert result['export_id'] is None
+
+
+def test_fetch_data_since_without_snapshot_when_save_fails(fake_jira, client, monkeypatch):
+    fake_jira.all_issues = [make_issue('LOG-1')]
+    baseline = client.post('/fetch_data', json={'type': 'avarias'}).get_json()
+
+    def fail_save(self, report_type, hashes):
+        raise OSError('disco somente leitura')
+
+    monkeypatch.setattr(jira_app.ExportHistory, 'save', fail_save)
+    fake_jira.changed_issues = [make_issue('LOG-2')]
+    result = client.post('/fetch_data', json={
+        'type': 'avarias', 'since': baseline['export_id']
+    }).get_json()
+
+    assert result['success']
+    assert result['count'] == 1
+    assert result['export_id'] is None
+
+
+def test_fetch_data_skips_snapshot_for_incomplete_full_export(fake_jira, client):
+    fake_jira.all_issues = [make_issue('LOG-1'), make_issue('LOG-1')]
+
+    result = client.post('/fetch_data', json={'type': 'avarias'}).get_json()
+
+    assert result['success']
+    assert result['export_id'] is None
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from utils.export_history import (
+    CHANGE_COLUMN, CHANGE_CREATED, CHANGE_REMOVED, CHANGE_UPDATED,
+    ExportHistory, build_delta, hash_rows_by_issue,
+)
+
+
+BASELINE_ROWS = [
+    {'LOG': 'LOG-1', 'Produto': 'Arroz'},
+    {'LOG': 'LOG-1', 'Produto': 'Feijão'},
+    {'LOG': 'LOG-2', 'Produto': 'Leite'},
+    {'LOG': 'LOG-3', 'Produto': 'Café'},
+]
+
+
+@pytest.fixture
+def history(tmp_path):
+    return ExportHistory(directory=str(tmp_path), keep=30)
+
+
+def test_hash_rows_by_issue_groups_rows_by_log():
+    hashes = hash_rows_by_issue(BASELINE_ROWS)
+
+    assert list(hashes) == ['LOG-1', 'LOG-2', 'LOG-3']
+    assert hashes == hash_rows_by_issue([dict(row) for row in BASELINE_ROWS])
+
+
+def test_hash_rows_by_issue_changes_with_any_row_of_the_issue():
+    changed = BASELINE_ROWS[:1] + [{'LOG': 'LOG-1', 'Produto': 'Açúcar'}] + BASELINE_ROWS[2:]
+
+    before = hash_rows_by_issue(BASELINE_ROWS)
+    after = hash_rows_by_issue(changed)
+
+    assert before['LOG-1'] != after['LOG-1']
+    assert before['LOG-2'] == after['LOG-2']
+
+
+def test_build_delta_classifies_changes():
+    baseline = hash_rows_by_issue(BASELINE_ROWS)
+    changed_rows = [
+        {'LOG': 'LOG-1', 'Produto': 'Arroz'},
+        {'LOG': 'LOG-1', 'Produto': 'Feijão'},
+        {'LOG': 'LOG-2', 'Produto': 'Leite integral'},
+        {'LOG': 'LOG-4', 'Produto': 'Pão'},
+    ]
+
+    delta_rows, new_hashes = build_delta(baseline, changed_rows, ['LOG-3'])
+
+    assert delta_rows == [
+        {CHANGE_COLUMN: CHANGE_UPDATED, 'LOG': 'LOG-2', 'Produto': 'Leite integral'},
+        {CHANGE_COLUMN: CHANGE_CREATED, 'LOG': 'LOG-4', 'Produto': 'Pão'},
+        {CHANGE_COLUMN: CHANGE_REMOVED, 'LOG': 'LOG-3'},
+    ]
+    assert set(new_hashes) == {'LOG-1', 'LOG-2', 'LOG-4'}
+    assert new_hashes['LOG-1'] == baseline['LOG-1']
+
+
+def test_build_delta_ignores_removed_keys_outside_baseline():
+    baseline = hash_rows_by_issue(BASELINE_ROWS)
+
+    delta_rows, new_hashes = build_delta(baseline, [], ['LOG-99'])
+
+    assert delta_rows == []
+    assert new_hashes == baseline
+
+
+def test_resolve_by_id(history):
+    export = history.save('avarias', {'LOG-1': 'abc'})
+
+    resolved, error = history.resolve('avarias', export['id'])
+
+    assert error is None
+    assert resolved == export
+
+
+def test_resolve_by_date_uses_latest_export_until_then(history):
+    export = history.save('avarias', {'LOG-1': 'abc'})
+
+    resolved, error = history.resolve('avarias', '2999-01-01T00:00')
+    assert error is None
+    assert resolved['id'] == export['id']
+
+    resolved, error = history.resolve('avarias', '2000-01-01')
+    assert resolved is None
+    assert 'Nenhuma exportação' in error
+
+
+@pytest.mark.parametrize('reference', ['31/12/2998', '31/12/2998 23:59', '2998-12-31T23:59'])
+def test_resolve_accepts_brazilian_and_iso_dates(history, reference):
+    export = history.save('avarias', {'LOG-1': 'abc'})
+    history.save('avarias', {})
+    # Renomeia o último snapshot para uma data futura, que não deve ser escolhida
+    latest = history.list_ids('avarias')[-1]
+    os.rename(history.path(latest), history.path('avarias-29990101000000000000-abcdef'))
+
+    resolved, error = history.resolve('avarias', reference)
+
+    assert error is None
+    assert resolved['id'] == export['id']
+
+
+def test_resolve_names_expected_format_for_unknown_reference(history):
+    resolved, error = history.resolve('avarias', '18-10-2026')
+
+    assert resolved is None
+    assert 'dd/mm/aaaa' in error
+
+
+def test_resolve_rejects_export_of_another_type(history):
+    export = history.save('avarias', {'LOG-1': 'abc'})
+
+    resolved, error = history.resolve('devolucoes', export['id'])
+
+    assert resolved is None
+    assert 'não é do tipo devolucoes' in error
+
+
+def test_load_rejects_path_traversal(history, tmp_path):
+    outside = tmp_path.parent / 'segredo.json'
+    outside.write_text('{"id": "segredo", "type": "avarias"}', encoding='utf-8')
+
+    assert history.load(os.path.join('..', 'segredo')) is None
+    resolved, error = history.resolve('avarias', '../segredo')
+    assert resolved is None
+    assert 'Exportação não encontrada' in error
+
+
+def test_save_prunes_old_snapshots(tmp_path):
+    history = ExportHistory(directory=str(tmp_path), keep=2)
+
+    exports = [history.save('avarias', {}) for _ in range(3)]
+
+    assert len(history.list_ids('avarias')) == 2
+    assert history.load(exports[-1]['id']) is not None
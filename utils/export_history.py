@@ -0,0 +1,168 @@
+from datetime import datetime
+import hashlib
+import json
+import os
+import uuid
+
+# Nome da coluna adicionada nas exportações incrementais
+CHANGE_COLUMN = 'Tipo de Alteração'
+CHANGE_CREATED = 'Criado'
+CHANGE_UPDATED = 'Atualizado'
+CHANGE_REMOVED = 'Removido'
+
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S%f'
+
+# Formatos aceitos para informar a data da exportação base
+REFERENCE_DATE_FORMATS = ['%d/%m/%Y %H:%M', '%d/%m/%Y']
+
+
+def parse_reference_date(reference):
+    """Converte dd/mm/aaaa [HH:MM] ou ISO (aaaa-mm-dd[THH:MM]) em datetime"""
+    for date_format in REFERENCE_DATE_FORMATS:
+        try:
+            return datetime.strptime(reference, date_format)
+        except ValueError:
+            pass
+
+    try:
+        return datetime.fromisoformat(reference)
+    except ValueError:
+        return None
+
+
+def hash_rows_by_issue(rows):
+    """Agrupa as linhas exportadas por LOG e calcula um hash do conteúdo de cada issue"""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row['LOG'], []).append(row)
+
+    return {
+        key: hashlib.sha1(
+            json.dumps(issue_rows, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+        ).hexdigest()
+        for key, issue_rows in grouped.items()
+    }
+
+
+def build_delta(baseline_hashes, changed_rows, removed_keys):
+    """Compara as issues atualizadas com a exportação base.
+
+    `changed_rows` são as linhas das issues atualizadas que atendem ao filtro
+    do relatório e `removed_keys` as chaves das atualizadas que deixaram de
+    atender. Retorna as linhas que mudaram (com a coluna de tipo de alteração)
+    e o novo mapa de hashes, que passa a ser o snapshot da exportação atual.
+    """
+    changed_hashes = hash_rows_by_issue(changed_rows)
+
+    delta_rows = []
+    for row in changed_rows:
+        key = row['LOG']
+        if key not in baseline_hashes:
+            change = CHANGE_CREATED
+        elif baseline_hashes[key] != changed_hashes[key]:
+            change = CHANGE_UPDATED
+        else:
+            continue
+        delta_rows.append({CHANGE_COLUMN: change, **row})
+
+    # Issues que estavam na exportação base e não atendem mais ao filtro
+    removed = [
+        key for key in dict.fromkeys(removed_keys)
+        if key in baseline_hashes and key not in changed_hashes
+    ]
+    for key in removed:
+        delta_rows.append({CHANGE_COLUMN: CHANGE_REMOVED, 'LOG': key})
+
+    removed_set = set(removed)
+    new_hashes = {key: value for key, value in baseline_hashes.items() if key not in removed_set}
+    new_hashes.update(changed_hashes)
+
+    return delta_rows, new_hashes
+
+
+class ExportHistory:
+    """Guarda os hashes por issue de cada exportação em arquivos JSON"""
+
+    def __init__(self, directory=None, keep=None):
+        self.directory = directory or os.getenv('EXPORT_HISTORY_DIR', 'export_history')
+        self.keep = keep or int(os.getenv('EXPORT_HISTORY_KEEP', 30))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, export_id):
+        return os.path.join(self.directory, f'{export_id}.json')
+
+    def save(self, report_type, hashes):
+        """Registra uma nova exportação e retorna seus metadados"""
+        now = datetime.now()
+        export = {
+            'id': f'{report_type}-{now.strftime(TIMESTAMP_FORMAT)}-{uuid.uuid4().hex[:6]}',
+            'type': report_type,
+            'created_at': now.isoformat(timespec='seconds'),
+            'hashes': hashes,
+        }
+
+        # Escrita atômica para não deixar snapshots corrompidos
+        tmp_path = self.path(export['id']) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(export, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path(export['id']))
+
+        self.prune(report_type)
+        return export
+
+    def load(self, export_id):
+        """Carrega uma exportação pelo ID"""
+        if os.path.basename(export_id) != export_id:
+            return None
+
+        try:
+            with open(self.path(export_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_ids(self, report_type):
+        """IDs das exportações de um tipo, da mais antiga para a mais recente"""
+        prefix = f'{report_type}-'
+        return sorted(
+            name[:-len('.json')] for name in os.listdir(self.directory)
+            if name.startswith(prefix) and name.endswith('.json')
+        )
+
+    def resolve(self, report_type, reference):
+        """Encontra a exportação base a partir de um ID ou de uma data/hora.
+
+        Para datas, usa a exportação mais recente feita até aquele momento.
+        """
+        reference = reference.strip()
+
+        export = self.load(reference)
+        if export:
+            if export['type'] != report_type:
+                return None, f'A exportação {reference} não é do tipo {report_type}'
+            return export, None
+
+        timestamp = parse_reference_date(reference)
+        if timestamp is None:
+            return None, (
+                f'Exportação não encontrada: {reference}. '
+                'Informe o ID de uma exportação ou uma data no formato dd/mm/aaaa ou dd/mm/aaaa HH:MM'
+            )
+
+        limit = timestamp.strftime(TIMESTAMP_FORMAT)
+        for export_id in reversed(self.list_ids(report_type)):
+            # O ID carrega o horário da exportação, evitando abrir todos os arquivos
+            if export_id[len(report_type) + 1:].split('-')[0] <= limit:
+                export = self.load(export_id)
+                if export:
+                    return export, None
+
+        return None, f'Nenhuma exportação de {report_type} encontrada até {reference}'
+
+    def prune(self, report_type):
+        """Remove os snapshots mais antigos além do limite configurado"""
+        for export_id in self.list_ids(report_type)[:-self.keep]:
+            try:
+                os.remove(self.path(export_id))
+            except OSError:
+                pass